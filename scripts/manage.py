@@ -3,8 +3,6 @@ from pathlib import Path
 
 import typer
 
-from noteomatic.lib import extract_from_files
-
 app = typer.Typer()
 
 logging.basicConfig(
@@ -23,6 +21,10 @@ def extract(
     build_dir: Path = typer.Option("build", help="Directory for build artifacts"),
 ):
     """Submit a new PDF or directory of PDFs for processing."""
+    # Imported lazily: noteomatic.lib drags in litellm, which costs over a
+    # second of import time that --help and completion should not pay.
+    from noteomatic.lib import extract_from_files
+
     processed_files = extract_from_files(source, raw_dir, build_dir)
     typer.echo(f"Processed {len(processed_files)} files")
 
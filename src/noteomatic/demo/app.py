@@ -1,15 +1,19 @@
 import base64
+import functools
+import hashlib
 import logging
-import os
-import re
+import queue
+import shutil
 import subprocess
 import tempfile
+import threading
 import traceback
-from datetime import datetime
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import List
 
-import bs4
 import graphviz
 from bs4 import BeautifulSoup, Tag
 from flask import (
@@ -22,28 +26,12 @@ from flask import (
     request,
     url_for,
 )
-from markdown_it import MarkdownIt
-from mdit_py_plugins.footnote import footnote_plugin
-from mdit_py_plugins.front_matter import front_matter_plugin
-from mdit_py_plugins.tasklists import tasklists_plugin
-
 from noteomatic.config import settings
-from noteomatic.demo.database import NoteModel, get_repo
+from noteomatic.demo.database import NoteModel, get_repo, note_row_from_file
+from noteomatic.demo.render import render_note_html
 from noteomatic.lib import extract_from_files
 from noteomatic.notes import note_hash
 
-# Cache for database connection
-_db_connection = None
-
-
-# Initialize markdown parser
-md = (
-    MarkdownIt("commonmark", {"breaks": True, "html": True})
-    .use(front_matter_plugin)
-    .use(footnote_plugin)
-    .use(tasklists_plugin)
-    .enable("table")
-)
 
 def get_note_by_id(note_id: int) -> NoteModel:
     """Get a note by its ID"""
@@ -56,49 +44,52 @@ def get_note_by_id(note_id: int) -> NoteModel:
 
 def get_all_notes() -> List[NoteModel]:
     """Get all notes from the database"""
+    # preview_text is computed once at ingest and stored on the row, so list
+    # views never re-parse note bodies per request.
     with get_repo() as repo:
-        notes = repo.get_all()
-        for note in notes:
-            # Parse content and get first two paragraphs
-            soup = BeautifulSoup(note.raw_content, "html.parser")
-            preview_paras = []
-            for p in soup.find_all(["p", "div"]):
-                if p.get_text().strip():  # Only include non-empty paragraphs
-                    preview_paras.append(p.get_text().strip())
-                    if len(preview_paras) == 2:
-                        break
-            note.preview_text = "\n".join(preview_paras) if preview_paras else ""
-        return notes
-
-
-def count_notes() -> int:
-    """Count the number of notes in the database"""
-    with get_repo() as repo:
-        return repo.count()
+        return repo.get_all()
 
 
 def load_notes_from_dir(dir: Path) -> List[NoteModel]:
-    """Load all notes from a directory into the database"""
-    notes = []
+    """Sync the database with a notes directory, parsing only changed files.
+
+    The database persists across restarts, so only files that are new or
+    whose mtime moved past the recorded ingest mtime are re-parsed; rows for
+    deleted files are dropped. Parsing fans out to a process pool and the
+    rows land in one transaction (the SQLite connection is not shareable
+    across processes). Paths are the identity unit — notes.path is unique —
+    so duplicate titles across files are allowed and coexist.
+    """
+    # rglob iterates via os.scandir and filters on the pattern, avoiding the
+    # per-entry Path construction and suffix checks an os.walk loop pays.
+    disk = {str(file.relative_to(dir)): file for file in dir.rglob("*.md")}
+
     with get_repo() as repo:
-        repo.reset()
-        for dirpath, dirnames, filenames in os.walk(dir):
-            for filename in filenames:
-                file = Path(dirpath) / filename
-                if file.is_dir() or file.suffix != ".md":
-                    continue
-
-                content, note = NoteModel.from_file(file, NOTES_DIR)
-
-                note = repo.create(
-                    title=note.title,
-                    path=note.path,
-                    content=content,
-                    tags=note.tags,
-                    created_at=note.created_at or datetime.now(),
-                )
-                notes.append(note)
-    return notes
+        repo.ensure_schema()
+        known = repo.get_path_mtimes()
+
+        removed = [path for path in known if path not in disk]
+        changed = [
+            file
+            for path, file in disk.items()
+            if path not in known or (known[path] or 0) < file.stat().st_mtime
+        ]
+        repo.remove_by_paths(
+            removed + [str(f.relative_to(dir)) for f in changed]
+        )
+
+        if changed:
+            rows = {}
+            with ProcessPoolExecutor() as pool:
+                for row in pool.map(
+                    partial(note_row_from_file, notes_dir=dir),
+                    changed,
+                    chunksize=16,
+                ):
+                    rows[row["path"]] = row
+            repo.bulk_create(list(rows.values()))
+
+        return repo.get_all()
 
 
 NOTES_DIR = settings.notes_dir
@@ -118,12 +109,61 @@ logging.basicConfig(
 )
 
 
+# One load at a time: the startup thread and the upload worker both call
+# _init, and two concurrent loads would compute the same changed set and
+# race to insert the same paths into the unique-path notes table.
+_load_lock = threading.Lock()
+
+
 def _init():
-    logging.info(f"Initializing database from {NOTES_DIR}")
-    load_notes_from_dir(NOTES_DIR)
+    with _load_lock:
+        logging.info(f"Initializing database from {NOTES_DIR}")
+        load_notes_from_dir(NOTES_DIR)
+
+
+_init_lock = threading.Lock()
+_init_started = False
+
+
+def _background_init():
+    """_init with failure visibility: a daemon thread's exception otherwise
+    vanishes into the threading excepthook and the site silently serves an
+    empty index forever. Log it and re-arm so the next request retries."""
+    global _init_started
+    try:
+        _init()
+    except Exception:
+        logging.exception("Background notes load failed; retrying on next request")
+        with _init_lock:
+            _init_started = False
+
+
+def _start_background_init():
+    """Run the notes load once, off the import and request paths.
 
+    Importing the module no longer blocks on a directory walk. The first
+    request creates the schema synchronously, so queries never race a
+    missing table, then hands the (incremental) load to a daemon thread
+    and answers immediately.
+    """
+    global _init_started
+    # Hold the lock across schema creation: a second concurrent first
+    # request must not proceed to its handler before the tables exist.
+    with _init_lock:
+        if _init_started:
+            return
+        with get_repo() as repo:
+            repo.ensure_schema()
+        threading.Thread(target=_background_init, daemon=True).start()
+        _init_started = True
 
-_init()
+
+@app.before_request
+def _ensure_initialized():
+    _start_background_init()
+
+
+SEARCH_PAGE_SIZE = 25
 
 
 @app.route("/search")
@@ -133,26 +173,28 @@ def search():
     if not query:
         return render_template("search.html", error="No query provided")
 
-    with get_repo() as repo:
-        search_results = repo.search(query)
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
 
-    # Extract snippets
-    for note in search_results:
-        content = note.raw_content
-        soup = BeautifulSoup(content, "html.parser")
+    # Snippets arrive pre-highlighted from FTS5; no per-hit parsing here.
+    # Fetch one extra row to know whether a next page exists without a
+    # second COUNT query over the match set.
+    with get_repo() as repo:
+        search_results = repo.search(
+            query,
+            limit=SEARCH_PAGE_SIZE + 1,
+            offset=(page - 1) * SEARCH_PAGE_SIZE,
+        )
 
-        # Find the first paragraph that contains the query
-        for p in soup.find_all("p"):
-            if query.lower() in p.text.lower():
-                note.snippet = str(p)
-                break
-        else:
-            # If not found in paragraphs, try other elements
-            snippet = soup.find(["p", "div"])
-            if snippet:
-                note.snippet = str(snippet)
+    has_next = len(search_results) > SEARCH_PAGE_SIZE
+    search_results = search_results[:SEARCH_PAGE_SIZE]
 
-    return render_template("search.html", query=query, results=search_results)
+    return render_template(
+        "search.html",
+        query=query,
+        results=search_results,
+        page=page,
+        has_next=has_next,
+    )
 
 
 @app.route("/")
@@ -162,14 +204,6 @@ def index():
     return render_template("index.html", notes=notes, show_search=True)
 
 
-def process_wikilinks(content: str) -> str:
-    """Convert [[tag]] syntax to links"""
-    def replace_link(match):
-        tag = match.group(1)
-        return f'<a href="/tag/{tag}">{tag}</a>'
-    
-    return re.sub(r'\[\[([^\]]+)\]\]', replace_link, content)
-
 @app.route("/note/<int:note_id>", methods=["GET"])
 def show_note(note_id):
     """Display a specific note"""
@@ -177,22 +211,16 @@ def show_note(note_id):
     if not note:
         abort(404, "Note not found")
 
-    # First render markdown to HTML
-    html_content = md.render(note.raw_content)
-    
-    # Process any [[tag]] links
-    html_content = process_wikilinks(html_content)
-
-    # compute prev_url and next_url
-    note_index = int(note.id)
-    note_count = count_notes()
-    prev_url = None
-    next_url = None
+    # Pre-rendered at ingest; the fallback only runs for rows written before
+    # the column existed.
+    html_content = note.rendered_html or render_note_html(note.raw_content)
 
-    if note_index > 0:
-        prev_url = f"/note/{note_index - 1}"
-    if note_index < note_count - 1:
-        next_url = f"/note/{note_index + 1}"
+    # compute prev_url and next_url from the display-order neighbors; note
+    # ids are sparse, so arithmetic on them skips and dangles.
+    with get_repo() as repo:
+        prev_id, next_id = repo.get_neighbors(note)
+    prev_url = f"/note/{prev_id}" if prev_id is not None else None
+    next_url = f"/note/{next_id}" if next_id is not None else None
 
     return render_template(
         "note.html",
@@ -209,21 +237,14 @@ def show_note(note_id):
 @app.route("/tag/<tag>")
 def show_tag(tag):
     """Show notes with specific tag"""
-    notes = get_all_notes()
-    tagged_notes = []
-
     tag = tag.lower()
-    for note in notes:
-        if tag in [t.lower() for t in note.tags]:
-            # Read the content and extract a snippet
-            content = note.raw_content
-            soup = BeautifulSoup(content, "html.parser")
-
-            # Get first paragraph or similar for snippet
-            snippet = soup.find(["p", "div"])
-            if snippet:
-                note.snippet = str(snippet)
-            tagged_notes.append(note)
+    with get_repo() as repo:
+        tagged_notes = repo.get_by_tag(tag)
+
+    # Previews were materialized at ingest; no body load or parse per hit.
+    for note in tagged_notes:
+        if note.preview_text:
+            note.snippet = note.preview_text
 
     return render_template("tag.html", tag=tag, notes=tagged_notes)
 
@@ -231,11 +252,14 @@ def show_tag(tag):
 @app.route("/tags")
 def show_all_tags():
     """Show all available tags"""
-    notes = get_all_notes()
-    all_tags = set()
-    for note in notes:
-        all_tags.update(tag.lower() for tag in note.tags)
-    return render_template("tags.html", tags=sorted(all_tags))
+    with get_repo() as repo:
+        return render_template("tags.html", tags=repo.get_all_tags())
+
+
+@functools.lru_cache(maxsize=1)
+def _tufte_css() -> str:
+    """The tufte.css payload inlined into shared notes; static, read once."""
+    return (DEMO_DIR / "static" / "tufte.css").read_text()
 
 
 @app.post("/share/<int:note_id>")
@@ -247,7 +271,7 @@ def share_note(note_id):
     # Create a temporary directory
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
-        tufte_css = (settings.static_dir / "tufte.css").read_text()
+        tufte_css = _tufte_css()
 
         standalone_html = render_template(
             "shared_note.html",
@@ -274,6 +298,60 @@ def share_note(note_id):
         )
 
 
+# Styling for rendered graphs; one stylesheet instead of attribute-by-
+# attribute rewrites of every node and edge.
+GRAPH_SVG_STYLE = (
+    "g.node ellipse,g.node polygon"
+    "{fill:#f7f7f7;stroke:#2b2b2b;stroke-width:2}"
+    "g.node text{font-family:Helvetica;font-size:14px}"
+    "g.edge path{stroke:#2b2b2b;stroke-width:1.5}"
+    "g.edge polygon{fill:#2b2b2b;stroke:#2b2b2b}"
+)
+
+
+def _dot_digest(dot_content: str) -> str:
+    """Stable digest of a dot source; cache filename and ETag."""
+    return hashlib.blake2b(dot_content.encode(), digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=512)
+def _render_graph_cached(dot_content: str) -> str:
+    """Render and style a graphviz diagram, memoized on the dot source.
+
+    Rendering forks the dot binary; the output is a pure function of the
+    source, so repeat views hit the in-process cache, and a disk cache
+    under build/graph_cache carries hits across restarts and workers.
+    """
+    cache_file = (
+        Path(settings.build_dir) / "graph_cache" / f"{_dot_digest(dot_content)}.svg"
+    )
+    if cache_file.exists():
+        return cache_file.read_text()
+
+    dot = graphviz.Source(dot_content)
+
+    # Render to SVG
+    svg_data = dot.pipe(format="svg")
+
+    # Inject a single stylesheet rather than walking every node and edge
+    svg_soup = BeautifulSoup(svg_data, "xml")
+    svg: Tag = svg_soup.find("svg")  # type: ignore
+    if svg:
+        svg["style"] = "background-color: transparent;"
+        style = svg_soup.new_tag("style")
+        style.string = GRAPH_SVG_STYLE
+        svg.insert(0, style)
+
+    result = str(svg_soup)
+
+    # Write atomically so a concurrent request never reads a partial file
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp_file.write_text(result)
+    tmp_file.replace(cache_file)
+    return result
+
+
 @app.route("/graph")
 def render_graph():
     """Render a graphviz diagram"""
@@ -283,45 +361,46 @@ def render_graph():
 
     # Decode the base64 dot data
     dot_content = base64.urlsafe_b64decode(dot_data).decode()
-    dot = graphviz.Source(dot_content)
 
-    # Render to SVG
-    svg_data = dot.pipe(format="svg")
+    # The rendered SVG is immutable for a given dot source, so let browsers
+    # cache it indefinitely and answer revalidations with a 304.
+    etag = _dot_digest(dot_content)
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag,
+    }
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
 
-    # Parse the SVG to add styling
-    svg_soup = BeautifulSoup(svg_data)
+    svg = _render_graph_cached(dot_content)
+    return Response(svg, mimetype="image/svg+xml", headers=headers)
+
+
+# Upload processing runs on a single background worker so the HTTP handler
+# returns immediately; clients poll /upload/status/<job_id> for completion.
+_upload_jobs: dict = {}
+_upload_queue: queue.Queue = queue.Queue()
 
-    # Find the root SVG element
-    svg: Tag = svg_soup.find("svg")  # type: ignore
-    if svg:
-        # Add styling attributes
-        svg["style"] = "background-color: transparent;"
 
-        # Style the nodes
-        for node in svg_soup.find_all("g", class_="node"):
-            ellipse = node.find("ellipse") or node.find("polygon")
-            if ellipse:
-                ellipse["fill"] = "#f7f7f7"
-                ellipse["stroke"] = "#2b2b2b"
-                ellipse["stroke-width"] = "2"
-            text = node.find("text")
-            if text:
-                text["font-family"] = "Helvetica"
-                text["font-size"] = "14px"
-
-        # Style the edges
-        for edge in svg_soup.find_all("g", class_="edge"):
-            path = edge.find("path")
-            if path:
-                path["stroke"] = "#2b2b2b"
-                path["stroke-width"] = "1.5"
-            arrow = edge.find("polygon")
-            if arrow:
-                arrow["fill"] = "#2b2b2b"
-                arrow["stroke"] = "#2b2b2b"
-
-    # Return the modified SVG
-    return Response(str(svg_soup), mimetype="image/svg+xml")
+def _upload_worker():
+    while True:
+        job_id, file_path = _upload_queue.get()
+        job = _upload_jobs[job_id]
+        job["status"] = "processing"
+        try:
+            extract_from_files(file_path, settings.raw_dir, Path(settings.build_dir))
+            # pick up the new notes; the reload is incremental
+            _init()
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "error"
+            job["error"] = str(e)
+            job["traceback"] = traceback.format_exc()
+        finally:
+            _upload_queue.task_done()
+
+
+threading.Thread(target=_upload_worker, daemon=True).start()
 
 
 @app.route("/upload", methods=["GET", "POST"])
@@ -348,21 +427,26 @@ def upload():
     upload_dir.mkdir(parents=True, exist_ok=True)
 
     file_path = upload_dir / file.filename
-    file.save(str(file_path))
+    # Stream to disk in 1 MiB chunks; file.save copies in 16 KiB pieces,
+    # which is a lot of syscalls for a scanned-notebook PDF.
+    with open(file_path, "wb") as dst:
+        shutil.copyfileobj(file.stream, dst, length=1024 * 1024)
+
+    # Queue extraction and return immediately; LLM processing takes far
+    # longer than a request should block.
+    job_id = uuid.uuid4().hex
+    _upload_jobs[job_id] = {"status": "queued", "filename": file.filename}
+    _upload_queue.put((job_id, file_path))
+    return jsonify({"success": True, "job_id": job_id}), 202
 
-    try:
-        # Process the uploaded PDF
-        extract_from_files(file_path, upload_dir, Path(settings.build_dir))
-        # reload the database
-        _init()
-        return jsonify({"success": True})
-    except Exception as e:
-        return (
-            jsonify(
-                {"success": False, "error": str(e), "traceback": traceback.format_exc()}
-            ),
-            500,
-        )
+
+@app.route("/upload/status/<job_id>")
+def upload_status(job_id):
+    """Report the state of a queued upload job."""
+    job = _upload_jobs.get(job_id)
+    if not job:
+        abort(404, "Unknown job")
+    return jsonify(job)
 
 
 @app.route("/note/<int:note_id>/edit", methods=["GET"])
@@ -388,14 +472,17 @@ def save_note(note_id):
     if not content:
         abort(400, "No content provided")
 
-    # update note file on disk and then reload the database
+    # update note file on disk, then upsert just this note; the FTS
+    # triggers keep the search index in sync, so no directory rescan.
     note_path = settings.notes_dir / note.path
     logging.info("Updating note: %s", note_path)
-    with open(note_path, "w") as f:
-        f.write(content)
+    # One encode + one write; text mode would re-encode through a small
+    # buffered writer.
+    note_path.write_bytes(content.encode())
 
-    # reload the database
-    _init()
+    row = note_row_from_file(note_path, NOTES_DIR)
+    with get_repo() as repo:
+        repo.create(**row)
 
     return redirect(url_for("show_note", note_id=note_id))
 
@@ -1,32 +1,52 @@
+import io
+import re
 import sqlite3
-import tempfile
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 from typing import Generator, List, Optional
 
 from bs4 import BeautifulSoup
+from lxml import etree
 from sqlalchemy import (
     JSON,
     DateTime,
+    Float,
+    ForeignKey,
     Integer,
     String,
     Text,
+    column,
     create_engine,
+    delete,
+    distinct,
     event,
+    insert,
     select,
     text,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, sessionmaker
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    mapped_column,
+    scoped_session,
+    sessionmaker,
+    undefer,
+)
 
 from noteomatic import config
+from noteomatic.demo.render import render_note_html
 from noteomatic.notes import parse_note
 
 
 class SqliteConnection:
     def __init__(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=True)
-        self.engine = create_engine(url=f"sqlite:///{self.tmp.name}")
+        # Persistent on-disk database: startup only re-parses notes whose
+        # files changed, instead of rebuilding the whole index every run.
+        self.db_path = config.settings.build_dir / "notes.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.engine = create_engine(url=f"sqlite:///{self.db_path}")
 
         @event.listens_for(self.engine, "connect")
         def set_sqlite_pragma(dbapi_connection, connection_record):
@@ -34,6 +54,13 @@ class SqliteConnection:
                 cursor = dbapi_connection.cursor()
                 cursor.execute("PRAGMA journal_mode=WAL")
                 cursor.execute("PRAGMA busy_timeout=10000")  # 10s timeout
+                # WAL-safe tuning: NORMAL still survives app crashes (the WAL
+                # is fsynced at checkpoint), and the rest keep sorts, temp
+                # tables, and hot pages in memory instead of on disk.
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA temp_store=MEMORY")
+                cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+                cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
                 cursor.close()
 
 
@@ -47,32 +74,92 @@ class Base(DeclarativeBase):
 
 def parse_html_content(content: str):
     """Parse HTML content and return article content."""
-    soup = BeautifulSoup(content, "html.parser")
+    soup = BeautifulSoup(content, "lxml")
     return soup.find("article") or soup.find("body") or soup
 
 
+def extract_preview_text(content: str, max_paras: int = 2) -> str:
+    """Extract the first few non-empty paragraphs of a note as preview text.
+
+    Uses a streaming parse that stops as soon as enough paragraphs are seen,
+    so ingest never builds a full DOM per note just for the preview.
+    """
+    # A front-matter-only note has an empty body; recover=True does not
+    # save iterparse from a zero-byte document.
+    if not content.strip():
+        return ""
+    preview_paras = []
+    parser = etree.iterparse(
+        io.BytesIO(content.encode()), events=("end",), html=True, recover=True
+    )
+    for _, elem in parser:
+        if elem.tag in ("p", "div"):
+            para = "".join(elem.itertext()).strip()
+            if para:  # Only include non-empty paragraphs
+                preview_paras.append(para)
+                if len(preview_paras) == max_paras:
+                    break
+    return "\n".join(preview_paras)
+
+
+# Compiled once: strptime rebuilds its format machinery on every call, and
+# ingest parses one date per note.
+_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+# FTS5 gives MATCH punctuation like -, ", : operator meaning; raw user input
+# crashes the query with a syntax error. Strip it once, here.
+_FTS_STRIP_RE = re.compile(r"[^\w\s]+")
+
+
+def fts_match_expr(query: str) -> str:
+    """Turn raw user input into a safe FTS5 MATCH expression.
+
+    Each remaining word is quoted so reserved tokens (AND, OR, NOT) stay
+    plain terms; quoted terms combine with FTS5's implicit AND. Returns ""
+    when nothing searchable remains.
+    """
+    terms = _FTS_STRIP_RE.sub(" ", query).split()
+    return " ".join(f'"{term}"' for term in terms)
+
+
 class NoteModel(Base):
     """Database model for notes"""
 
     __tablename__ = "notes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    title: Mapped[str] = mapped_column(String(255), nullable=False)
-    path: Mapped[str] = mapped_column(String(255), nullable=False)
-    content: Mapped[str] = mapped_column(Text, nullable=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    path: Mapped[str] = mapped_column(
+        String(255), nullable=False, unique=True, index=True
+    )
+    # Deferred: list views (index, tags, search hits) only need metadata and
+    # the materialized preview, so the multi-KB bodies stay on disk there.
+    content: Mapped[str] = mapped_column(Text, nullable=False, deferred=True)
     tags: Mapped[List[str]] = mapped_column(JSON, nullable=False, default=list)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, nullable=False, default=datetime.utcnow
+        DateTime, nullable=False, default=datetime.utcnow, index=True
     )
     snippet: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    preview_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    article_html: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True
+    )
+    rendered_html: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True
+    )
+    mtime: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     @property
     def raw_content(self) -> str:
         return self.content
 
     @property
-    def article_content(self):
-        return parse_html_content(self.content)
+    def article_content(self) -> str:
+        # Materialized at ingest; the parse below only runs for rows written
+        # before the column existed.
+        if self.article_html is not None:
+            return self.article_html
+        return str(parse_html_content(self.content))
 
     @classmethod
     def from_file(cls, file_path: Path, notes_dir: Path) -> tuple[str, "NoteModel"]:
@@ -80,10 +167,20 @@ class NoteModel(Base):
         content = file_path.read_text()
         front_matter, content = parse_note(content)
         created_at = front_matter.get("date")
-        if created_at:
+        if isinstance(created_at, datetime):
+            pass
+        elif isinstance(created_at, date):
+            # yaml parses unquoted dates into date objects directly
+            created_at = datetime(created_at.year, created_at.month, created_at.day)
+        elif created_at:
             # parse from YYYY-MM-DD
-            created_at = datetime.strptime(created_at, "%Y-%m-%d")
-        else:
+            match = _DATE_RE.search(str(created_at))
+            created_at = (
+                datetime(int(match[1]), int(match[2]), int(match[3]))
+                if match
+                else None
+            )
+        if not created_at:
             created_at = datetime.fromtimestamp(file_path.stat().st_ctime)
 
         title = front_matter["title"]
@@ -103,6 +200,38 @@ class NoteModel(Base):
         return content, note
 
 
+class NoteTagModel(Base):
+    """One row per (note, tag), indexed so tag lookups avoid a full scan"""
+
+    __tablename__ = "note_tags"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    note_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("notes.id"), nullable=False
+    )
+    tag: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+
+
+def note_row_from_file(file_path: Path, notes_dir: Path) -> dict:
+    """Parse one note file into a row dict for NoteRepository.bulk_create.
+
+    Standalone so reloads can fan parsing out to worker processes; only
+    plain values cross the pickle boundary.
+    """
+    content, note = NoteModel.from_file(file_path, notes_dir)
+    return dict(
+        title=note.title,
+        path=note.path,
+        content=content,
+        tags=note.tags,
+        created_at=note.created_at or datetime.now(),
+        preview_text=extract_preview_text(content),
+        article_html=str(parse_html_content(content)),
+        rendered_html=render_note_html(content),
+        mtime=file_path.stat().st_mtime,
+    )
+
+
 class NoteRepository:
     """Repository for database operations on notes"""
 
@@ -110,8 +239,20 @@ class NoteRepository:
         self.session = session
 
     def get_by_id(self, note_id: int) -> Optional[NoteModel]:
-        """Get a note by its ID"""
-        return self.session.get(NoteModel, note_id)
+        """Get a note by its ID, with the deferred body columns loaded.
+
+        Single-note views render the full body, and the instance outlives
+        the session, so fetch everything in the one query.
+        """
+        return self.session.get(
+            NoteModel,
+            note_id,
+            options=[
+                undefer(NoteModel.content),
+                undefer(NoteModel.article_html),
+                undefer(NoteModel.rendered_html),
+            ],
+        )
 
     def get_all(self) -> List[NoteModel]:
         """Get all notes ordered by creation date"""
@@ -131,15 +272,35 @@ class NoteRepository:
         content: str,
         tags: List[str],
         created_at: Optional[datetime] = None,
+        preview_text: Optional[str] = None,
+        article_html: Optional[str] = None,
+        rendered_html: Optional[str] = None,
+        mtime: Optional[float] = None,
     ) -> NoteModel:
-        """Create a new note or update existing one with same title"""
-        existing_note = self.get_by_title(title)
+        """Create a new note or update the row backing the same file.
+
+        The file path is the identity unit: the incremental loader keys on
+        it, so upserting by title here would leave a ghost row behind when
+        an edit renames a note.
+        """
+        if preview_text is None:
+            preview_text = extract_preview_text(content)
+        if article_html is None:
+            article_html = str(parse_html_content(content))
+        if rendered_html is None:
+            rendered_html = render_note_html(content)
+
+        existing_note = self.get_by_path(path)
 
         if existing_note:
             # Update existing note
-            existing_note.path = path
+            existing_note.title = title
             existing_note.content = content
             existing_note.tags = tags
+            existing_note.preview_text = preview_text
+            existing_note.article_html = article_html
+            existing_note.rendered_html = rendered_html
+            existing_note.mtime = mtime
             # Don't update created_at for existing notes
             note = existing_note
         else:
@@ -150,81 +311,254 @@ class NoteRepository:
                 content=content,
                 tags=tags,
                 created_at=created_at,
+                preview_text=preview_text,
+                article_html=article_html,
+                rendered_html=rendered_html,
+                mtime=mtime,
             )
             self.session.add(note)
         self.session.commit()
         self.session.refresh(note)
+        self._replace_tag_rows(note)
         return note
 
-    def search(self, query: str) -> List[NoteModel]:
-        """Search notes using full-text search"""
-        fts_query = text("SELECT rowid FROM notes_fts WHERE notes_fts MATCH :query")
-        matching_ids = self.session.execute(fts_query, {"query": query}).scalars()
-        stmt = select(NoteModel).where(NoteModel.id.in_(matching_ids))
-        return list(self.session.execute(stmt).scalars().all())
+    def _replace_tag_rows(self, note: NoteModel):
+        """Rebuild the note_tags index rows for a single note."""
+        self.session.execute(
+            delete(NoteTagModel).where(NoteTagModel.note_id == note.id)
+        )
+        for tag in note.tags:
+            self.session.add(NoteTagModel(note_id=note.id, tag=tag.strip().lower()))
+        self.session.commit()
+
+    def bulk_create(self, rows: List[dict]) -> None:
+        """Insert many notes with one executemany in a single transaction.
+
+        Unlike create(), this does no per-row title lookup or commit, so it
+        is the path for full reloads where the table was just reset.
+        """
+        if not rows:
+            return
+        for row in rows:
+            row.setdefault("preview_text", extract_preview_text(row["content"]))
+            row.setdefault("article_html", str(parse_html_content(row["content"])))
+            row.setdefault("rendered_html", render_note_html(row["content"]))
+        self.session.execute(insert(NoteModel), rows)
+
+        # Populate the tag index in the same transaction; ids are only known
+        # after the insert, so read back just the rows we inserted.
+        inserted_paths = [row["path"] for row in rows]
+        tag_rows = [
+            {"note_id": note_id, "tag": tag.strip().lower()}
+            for note_id, tags in self.session.execute(
+                select(NoteModel.id, NoteModel.tags).where(
+                    NoteModel.path.in_(inserted_paths)
+                )
+            )
+            for tag in tags
+        ]
+        if tag_rows:
+            self.session.execute(insert(NoteTagModel), tag_rows)
+        self.session.commit()
+
+    def search(
+        self, query: str, limit: int = 50, offset: int = 0
+    ) -> List[NoteModel]:
+        """Search notes using full-text search, best matches first.
+
+        Snippets are computed by FTS5 itself (with <mark> highlighting), so
+        hits need no Python-side parsing, and the result set is capped
+        instead of materializing every match; offset pages through the
+        bm25 ordering.
+        """
+        match = fts_match_expr(query)
+        if not match:
+            return []
+
+        # One round-trip: rank inside the FTS subquery, then join the note
+        # rows back on in the same statement, still ordered by score.
+        hits = (
+            text("""
+                SELECT rowid AS id, bm25(notes_fts) AS score,
+                       snippet(notes_fts, 1, '<mark>', '</mark>', '…', 32) AS snip
+                FROM notes_fts
+                WHERE notes_fts MATCH :query
+                ORDER BY score
+                LIMIT :limit OFFSET :offset
+            """)
+            .columns(
+                column("id", Integer), column("score", Float), column("snip", Text)
+            )
+            .subquery("hits")
+        )
+        stmt = (
+            select(NoteModel, hits.c.snip)
+            .join(hits, NoteModel.id == hits.c.id)
+            .order_by(hits.c.score)
+        )
+
+        results = []
+        for note, snip in self.session.execute(
+            stmt, {"query": match, "limit": limit, "offset": offset}
+        ):
+            note.snippet = snip
+            results.append(note)
+        return results
 
     def get_by_tag(self, tag: str) -> List[NoteModel]:
         """Get all notes with a specific tag"""
-        stmt = select(NoteModel).where(NoteModel.tags.contains([tag]))
+        stmt = (
+            select(NoteModel)
+            .join(NoteTagModel, NoteTagModel.note_id == NoteModel.id)
+            .where(NoteTagModel.tag == tag.strip().lower())
+            .order_by(NoteModel.created_at.desc(), NoteModel.title.desc())
+        )
         return list(self.session.execute(stmt).scalars().all())
 
     def get_all_tags(self) -> List[str]:
         """Get all unique tags"""
-        notes = self.get_all()
-        tags = set()
-        for note in notes:
-            tags.update(note.tags)
-        return sorted(tags)
+        stmt = select(distinct(NoteTagModel.tag)).order_by(NoteTagModel.tag)
+        return list(self.session.execute(stmt).scalars().all())
 
-    def get_by_title(self, title: str) -> Optional[NoteModel]:
-        """Get a note by its title"""
-        stmt = select(NoteModel).where(NoteModel.title == title)
+    def get_neighbors(
+        self, note: NoteModel
+    ) -> tuple[Optional[int], Optional[int]]:
+        """Ids of the notes before and after this one in display order.
+
+        Display order is newest first (matching get_all), so "prev" is the
+        next-newer note and "next" the next-older one. Ids are sparse, so
+        neighbors come from indexed (created_at, title) comparisons rather
+        than id arithmetic.
+        """
+        newer = (
+            select(NoteModel.id)
+            .where(
+                (NoteModel.created_at > note.created_at)
+                | (
+                    (NoteModel.created_at == note.created_at)
+                    & (NoteModel.title > note.title)
+                )
+            )
+            .order_by(NoteModel.created_at.asc(), NoteModel.title.asc())
+            .limit(1)
+        )
+        older = (
+            select(NoteModel.id)
+            .where(
+                (NoteModel.created_at < note.created_at)
+                | (
+                    (NoteModel.created_at == note.created_at)
+                    & (NoteModel.title < note.title)
+                )
+            )
+            .order_by(NoteModel.created_at.desc(), NoteModel.title.desc())
+            .limit(1)
+        )
+        prev_id = self.session.execute(newer).scalar_one_or_none()
+        next_id = self.session.execute(older).scalar_one_or_none()
+        return prev_id, next_id
+
+    def get_by_path(self, path: str) -> Optional[NoteModel]:
+        """Get the note backed by a file path."""
+        stmt = select(NoteModel).where(NoteModel.path == path)
         return self.session.execute(stmt).scalar_one_or_none()
 
+    def get_by_title(self, title: str) -> Optional[NoteModel]:
+        """Get a note by its title.
+
+        Titles are not unique — two files may carry the same front-matter
+        title — so this returns the newest match rather than raising.
+        """
+        stmt = (
+            select(NoteModel)
+            .where(NoteModel.title == title)
+            .order_by(NoteModel.created_at.desc())
+        )
+        return self.session.execute(stmt).scalars().first()
+
+    # FTS virtual table plus the triggers that keep it in sync with notes.
+    _FTS_DDL = [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts
+        USING fts5(title, content, tags, content='notes',
+                   content_rowid='id', tokenize='porter')
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, title, content, tags)
+            VALUES (new.id, new.title, new.content, new.tags);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content, tags)
+            VALUES('delete', old.id, old.title, old.content, old.tags);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content, tags)
+            VALUES('delete', old.id, old.title, old.content, old.tags);
+            INSERT INTO notes_fts(rowid, title, content, tags)
+            VALUES (new.id, new.title, new.content, new.tags);
+        END
+        """,
+    ]
+
+    def ensure_schema(self):
+        """Create tables, the FTS index, and triggers if they don't exist."""
+        with self.session.get_bind().begin() as conn:
+            Base.metadata.create_all(conn, checkfirst=True)
+            for ddl in self._FTS_DDL:
+                conn.execute(text(ddl))
+
     def reset(self):
         """Reset the database"""
-        Base.metadata.drop_all(self.session.get_bind())
-        Base.metadata.create_all(self.session.get_bind())
-        
-        # Create FTS virtual table
-        self.session.execute(text("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts 
-            USING fts5(title, content, tags, content='notes', content_rowid='id')
-        """))
-        
-        # Create triggers to keep FTS table in sync
-        self.session.execute(text("""
-            CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
-                INSERT INTO notes_fts(rowid, title, content, tags) 
-                VALUES (new.id, new.title, new.content, new.tags);
-            END
-        """))
-        
-        self.session.execute(text("""
-            CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
-                INSERT INTO notes_fts(notes_fts, rowid, title, content, tags) 
-                VALUES('delete', old.id, old.title, old.content, old.tags);
-            END
-        """))
-        
-        self.session.execute(text("""
-            CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
-                INSERT INTO notes_fts(notes_fts, rowid, title, content, tags) 
-                VALUES('delete', old.id, old.title, old.content, old.tags);
-                INSERT INTO notes_fts(rowid, title, content, tags) 
-                VALUES (new.id, new.title, new.content, new.tags);
-            END
-        """))
-        
+        # Run the whole rebuild on one connection in one transaction: the
+        # default drop_all/create_all on the engine autocommits per table and
+        # probes table existence before each CREATE. We just dropped
+        # everything, so skip the probes on create.
+        with self.session.get_bind().begin() as conn:
+            Base.metadata.drop_all(conn, checkfirst=True)
+            conn.execute(text("DROP TABLE IF EXISTS notes_fts"))
+            Base.metadata.create_all(conn, checkfirst=False)
+            for ddl in self._FTS_DDL:
+                conn.execute(text(ddl))
+
+    def get_path_mtimes(self) -> dict:
+        """Map of note path -> file mtime recorded at ingest."""
+        return dict(
+            self.session.execute(select(NoteModel.path, NoteModel.mtime)).all()
+        )
+
+    def remove_by_paths(self, paths: List[str]):
+        """Delete the notes (and their tag rows) backed by the given paths."""
+        if not paths:
+            return
+        ids = list(
+            self.session.execute(
+                select(NoteModel.id).where(NoteModel.path.in_(paths))
+            ).scalars()
+        )
+        if ids:
+            self.session.execute(
+                delete(NoteTagModel).where(NoteTagModel.note_id.in_(ids))
+            )
+            # The FTS delete trigger fires per removed note.
+            self.session.execute(delete(NoteModel).where(NoteModel.id.in_(ids)))
         self.session.commit()
 
 
-db = SessionLocal()
+# One session per thread: a single shared Session is not thread-safe and
+# serializes (or corrupts) concurrent Flask handlers under a threaded WSGI
+# server. The registry hands each thread its own session and connection.
+db = scoped_session(SessionLocal)
+
 
 @contextmanager
 def get_repo() -> Generator[NoteRepository, None, None]:
-    """Get repository instance with context management"""
+    """Get a repository bound to the current thread's session"""
     try:
-        yield NoteRepository(db)
+        yield NoteRepository(db())
     finally:
-        db.close()
+        db().close()
@@ -0,0 +1,40 @@
+"""Markdown rendering for note bodies, shared by ingest and request paths."""
+
+import functools
+import re
+
+from markdown_it import MarkdownIt
+from mdit_py_plugins.footnote import footnote_plugin
+from mdit_py_plugins.front_matter import front_matter_plugin
+from mdit_py_plugins.tasklists import tasklists_plugin
+
+# Initialize markdown parser
+md = (
+    MarkdownIt("commonmark", {"breaks": True, "html": True})
+    .use(front_matter_plugin)
+    .use(footnote_plugin)
+    .use(tasklists_plugin)
+    .enable("table")
+)
+
+_WIKILINK_RE = re.compile(r"\[\[([^\]]+)\]\]")
+
+
+def process_wikilinks(content: str) -> str:
+    """Convert [[tag]] syntax to links"""
+
+    def replace_link(match):
+        tag = match.group(1)
+        return f'<a href="/tag/{tag}">{tag}</a>'
+
+    return _WIKILINK_RE.sub(replace_link, content)
+
+
+@functools.lru_cache(maxsize=256)
+def render_note_html(content: str) -> str:
+    """Render note markdown to HTML with [[tag]] links resolved.
+
+    The result is deterministic per content string, so ingest stores it on
+    the row; the lru_cache covers rows written before the column existed.
+    """
+    return process_wikilinks(md.render(content))
@@ -1,13 +1,17 @@
 import glob
+import itertools
 import logging
 import multiprocessing.dummy
+import os
 import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 
 from noteomatic.llm import extract_notes, process_article_tags
 from noteomatic.notes import save_notes, split_notes
-from noteomatic.pdf import PdfOptions, extract_images_from_pdf
+from noteomatic.pdf import extract_images_from_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -19,22 +23,38 @@ def process_pdf_files(
     cache_dir: Optional[Path] = None,
 ):
     """Process a list of PDF files and generate notes."""
-    # Extract all images first
-    all_images = []
-    for pdf_file in sources:
-        logger.info(f"Extracting images from {pdf_file}")
-        images = extract_images_from_pdf(pdf_file, PdfOptions())
-        all_images.extend(images)
-
-    # Process all images in one batch
     cache_dir = build_dir / "cache" if cache_dir is None else cache_dir
     note_dir = build_dir / "notes"
     cache_dir.mkdir(parents=True, exist_ok=True)
     note_dir.mkdir(parents=True, exist_ok=True)
 
-    results = extract_notes(all_images, cache_dir=cache_dir)
-
-    # Split and save notes
+    # Pipeline extraction against the LLM stage: pool workers render ahead
+    # while the main process waits on completions for the current PDF, and
+    # each PDF's notes are saved as soon as it finishes. The submission
+    # window is capped so finished-but-unconsumed results never pile up
+    # every PDF's page images in the main process while the LLM stage runs.
+    max_workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pdf_iter = iter(sources)
+        pending = deque(
+            (pdf_file, pool.submit(extract_images_from_pdf, pdf_file))
+            for pdf_file in itertools.islice(pdf_iter, max_workers + 1)
+        )
+        while pending:
+            pdf_file, future = pending.popleft()
+            images = future.result()
+            # Top up the window before the LLM stage so workers stay busy.
+            for next_pdf in itertools.islice(pdf_iter, 1):
+                pending.append(
+                    (next_pdf, pool.submit(extract_images_from_pdf, next_pdf))
+                )
+            logger.info(f"Extracted {len(images)} images from {pdf_file}")
+            results = extract_notes(images, cache_dir=cache_dir)
+            _tag_and_save_notes(results, cache_dir, note_dir)
+
+
+def _tag_and_save_notes(results: List[str], cache_dir: Path, note_dir: Path):
+    """Split raw LLM output into notes, add tags/links, and save them."""
     all_notes = []
     for result in results:
         logger.info("Processing result of length %d", len(result))
@@ -63,18 +83,27 @@ def extract_from_files(source: Path, raw_dir: Path, build_dir: Path) -> List[Pat
 
     source = source.expanduser()
 
-    # Copy source to raw directory
-    sources = []
+    # Collect the PDFs to stage into the raw directory
     if source.is_file():
-        if source != raw_dir / source.name:
-            shutil.copy2(source, raw_dir / source.name)
-        sources.append(raw_dir / source.name)
+        pdfs = [source]
+    elif source.is_dir():
+        pdfs = sorted(source.rglob("*.pdf"))
     else:
-        for filename in glob.glob(str(source)):
-            pdf = Path(filename)
-            if pdf != raw_dir / pdf.name:
-                shutil.copy2(pdf, raw_dir / pdf.name)
-            sources.append(raw_dir / pdf.name)
+        # allow shell-style patterns, e.g. notes/2024*.pdf
+        pdfs = [Path(filename) for filename in glob.glob(str(source))]
+
+    # Copy sources to the raw directory; copy2 releases the GIL inside
+    # copy_file_range, so the copies can run in parallel.
+    sources = []
+    to_copy = []
+    for pdf in pdfs:
+        target = raw_dir / pdf.name
+        if pdf != target:
+            to_copy.append((pdf, target))
+        sources.append(target)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda pair: shutil.copy2(*pair), to_copy))
 
     if sources:
         process_pdf_files(sources, raw_dir, build_dir)
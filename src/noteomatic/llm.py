@@ -1,13 +1,19 @@
+import asyncio
 import base64
 import hashlib
 import logging
-import multiprocessing.dummy
 from datetime import date
 from pathlib import Path
 from typing import List, Optional
 
-from litellm import completion
+from litellm import RateLimitError, acompletion, completion
 from pydantic import BaseModel
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 from .config import settings
 from .pdf import ImageData
@@ -215,6 +221,27 @@ Remember to generate a completely new <article> with the tags and wiki links.
 
 EXTRACTION_MODEL = "gemini/gemini-2.0-flash-exp"
 
+# Cap on simultaneous in-flight LLM requests; beyond this Gemini starts
+# returning 429s, which the backoff below then has to absorb anyway.
+MAX_CONCURRENT_REQUESTS = 8
+
+
+@retry(
+    retry=retry_if_exception_type(RateLimitError),
+    wait=wait_random_exponential(multiplier=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+async def _complete(messages: List[dict]) -> str:
+    """Issue one completion request, backing off exponentially on 429s."""
+    response = await acompletion(
+        model=EXTRACTION_MODEL,
+        messages=messages,
+        num_retries=2,
+        api_key=settings.gemini_api_key,
+    )
+    return response.choices[0].message.content
+
 
 def _hash_images(images: List[ImageData]) -> str:
     """Create a deterministic hash for a batch of images"""
@@ -247,7 +274,7 @@ def _make_initial_request(images: List[ImageData]) -> List[dict]:
     return messages
 
 
-def query_llm_with_cleanup(cache_dir: Path, img_batch: List[ImageData]):
+async def query_llm_with_cleanup(cache_dir: Path, img_batch: List[ImageData]):
     """Helper function to handle two-pass LLM query with cleanup"""
     cache_key = _hash_images(img_batch)
     cache_file = cache_dir / f"{cache_key}.txt"
@@ -261,16 +288,7 @@ def query_llm_with_cleanup(cache_dir: Path, img_batch: List[ImageData]):
     messages = _make_initial_request(img_batch)
 
     # First pass - get initial notes
-    first_pass = (
-        completion(
-            model=EXTRACTION_MODEL,
-            messages=messages,
-            num_retries=2,
-            api_key=settings.gemini_api_key,
-        )
-        .choices[0]
-        .message.content
-    )
+    first_pass = await _complete(messages)
 
     # Second pass - cleanup with original results
     cleanup_messages = [
@@ -279,16 +297,7 @@ def query_llm_with_cleanup(cache_dir: Path, img_batch: List[ImageData]):
         {"role": "user", "content": CLEANUP_PROMPT},
     ]
 
-    cleaned = (
-        completion(
-            model=EXTRACTION_MODEL,
-            messages=cleanup_messages,
-            num_retries=2,
-            api_key=settings.gemini_api_key,
-        )
-        .choices[0]
-        .message.content
-    )
+    cleaned = await _complete(cleanup_messages)
 
     if cache_dir:
         cache_file.write_text(cleaned)
@@ -331,7 +340,10 @@ def process_article_tags(article: str, cache_dir: Path) -> str:
 
 
 def extract_notes(
-    images: List[ImageData], batch_size: int = 16, cache_dir: Optional[Path] = None
+    images: List[ImageData],
+    batch_size: int = 16,
+    cache_dir: Optional[Path] = None,
+    max_concurrent: int = MAX_CONCURRENT_REQUESTS,
 ) -> List[str]:
     """Process images through LLM to extract notes"""
     logging.info("Processing %d images in batches of %d", len(images), batch_size)
@@ -339,12 +351,20 @@ def extract_notes(
     if cache_dir:
         cache_dir.mkdir(parents=True, exist_ok=True)
 
-    # First pass: Extract notes from images
+    # First pass: Extract notes from images. Batches are independent, so run
+    # them concurrently under a semaphore instead of one blocking call at a
+    # time; results come back in batch order.
     image_batches = [
         images[i : i + batch_size] for i in range(0, len(images), batch_size)
     ]
-    with multiprocessing.dummy.Pool(1) as pool:
-        return pool.map(
-            lambda img_batch: query_llm_with_cleanup(cache_dir, img_batch),
-            image_batches,
-        )
+
+    async def _run_batches() -> List[str]:
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def _one(img_batch: List[ImageData]) -> str:
+            async with semaphore:
+                return await query_llm_with_cleanup(cache_dir, img_batch)
+
+        return list(await asyncio.gather(*[_one(b) for b in image_batches]))
+
+    return asyncio.run(_run_batches())
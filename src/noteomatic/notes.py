@@ -1,3 +1,4 @@
+import functools
 import hashlib
 import logging
 import re
@@ -9,9 +10,10 @@ from typing import Dict, List
 import yaml
 
 
+@functools.lru_cache(maxsize=1024)
 def note_hash(content: str) -> str:
     """Generate a consistent hash for note saving/sharing."""
-    return hashlib.md5(content.encode()).hexdigest()[:8]
+    return hashlib.blake2b(content.encode(), digest_size=4).hexdigest()
 
 
 def split_notes(note_result: str) -> List[str]: